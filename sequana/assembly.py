@@ -48,19 +48,30 @@ class BUSCO:
             code source (testing)
 
         """
-        # version 3.0.1
-        try:
-            self.df = pd.read_csv(filename, sep="\t", skiprows=4)
-
-            if "Status" not in self.df.columns:  # pragma: no cover
-                # version 5.2.2
-                self.df = pd.read_csv(filename, sep="\t", skiprows=2)
-        except pd.io.parsers.python_parser.ParserError:  # pragma: no cover
-            # it may happen that the parsing is incorrect with some files
-            self.df = pd.read_csv(filename, sep="\t", skiprows=2)
+        # the number of comment lines before the header differs between BUSCO
+        # versions (4 in v3.0.1, 2 in v5.X). Look for the header in the first
+        # few lines so the file itself is parsed only once.
+        skiprows = 2
+        with open(filename) as fin:
+            for i, line in enumerate(fin):
+                if i == 10:  # pragma: no cover
+                    break
+                if line.startswith("# Busco id") or line.startswith("Busco id"):
+                    skiprows = i
+                    break
+        # note that the pyarrow engine cannot be used here: BUSCO tables are
+        # ragged ('Missing' rows have only two columns), which only the C
+        # engine tolerates
+        self.df = pd.read_csv(filename, sep="\t", skiprows=skiprows)
 
         self.df.rename({"# Busco id": "ID"}, inplace=True, axis=1)
 
+        # categories are hashed on integer codes, which speeds up the
+        # aggregations performed in :meth:`summary` on large tables
+        self.df["Status"] = self.df["Status"].astype("category")
+
+        self._summary = None
+
     def pie_plot(self, filename=None, hold=False):
         """Pie plot of the status (completed / fragment / missed)
 
@@ -96,20 +107,18 @@ class BUSCO:
         """
         if hold is False:
             pylab.clf()
-        colors = ["green", "orange", "red", "blue"]
-        markers = ["o", "s", "x", "o"]
-        for i, this in enumerate(["Complete", "Fragmented", "Duplicated"]):
-            mask = self.df.Status == this
-            if sum(mask) > 0:
-                self.df[mask].plot(
-                    x="Length",
-                    y="Score",
-                    kind="scatter",
-                    color=colors[i],
-                    ax=pylab.gca(),
-                    marker=markers[i],
-                    label=this,
-                )
+        styles = {"Complete": ("green", "o"), "Fragmented": ("orange", "s"), "Duplicated": ("red", "x")}
+        ax = pylab.gca()
+        # a single groupby pass with the lightweight scatter API instead of
+        # one boolean mask + pandas .plot dispatch per status
+        for status, subdf in self.df.groupby("Status", observed=True):
+            try:
+                color, marker = styles[status]
+            except KeyError:
+                continue
+            ax.scatter(subdf["Length"], subdf["Score"], color=color, marker=marker, label=status)
+            ax.set_xlabel("Length")
+            ax.set_ylabel("Score")
 
         pylab.legend()
         pylab.grid()
@@ -120,20 +129,28 @@ class BUSCO:
         """Return summary information of the missing, completed, fragemented
         orthologs
 
+        The result is computed once and cached; if you mutate :attr:`df`,
+        reset :attr:`_summary` to None to invalidate the cache.
         """
+        if self._summary is not None:
+            return self._summary
+
         df = self.df.drop_duplicates(subset=["ID"])
+        # a single pass over the Status column instead of one scan per status
+        counts = df.Status.value_counts()
         data = {}
-        data["S"] = sum(df.Status == "Complete")
-        data["F"] = sum(df.Status == "Fragmented")
-        data["D"] = sum(df.Status == "Duplicated")
+        data["S"] = int(counts.get("Complete", 0))
+        data["F"] = int(counts.get("Fragmented", 0))
+        data["D"] = int(counts.get("Duplicated", 0))
         data["C"] = data["S"] + data["D"]
-        data["M"] = sum(df.Status == "Missing")
+        data["M"] = int(counts.get("Missing", 0))
         data["total"] = len(df)
         data["C_pc"] = data["C"] * 100.0 / data["total"]
         data["D_pc"] = data["D"] * 100.0 / data["total"]
         data["S_pc"] = data["S"] * 100.0 / data["total"]
         data["M_pc"] = data["M"] * 100.0 / data["total"]
         data["F_pc"] = data["F"] * 100.0 / data["total"]
+        self._summary = data
         return data
 
     def get_summary_string(self):
@@ -199,27 +216,28 @@ class BUSCO:
         # if we have duplicated hits, we group them and take the best score
         # we then drop the ID to keep the index.
         # Note the fillna set to 0 to include 'Missing' entries
-        indices = self.df.fillna(0).groupby("ID")["Score"].nlargest(1).reset_index(level=0, drop=True).index
+        indices = self.df["Score"].fillna(0).groupby(self.df["ID"]).idxmax()
         subdf = self.df.loc[indices]
 
         # we sort the entries by gene (core genome) name
         # useful if we want to merge the sequences for a multiple alignment
 
+        chunks = []
+        columns = ["Status", "ID", "Sequence", "Gene Start", "Gene End"]
+        for type_, ID, seqname, start, end in subdf[columns].itertuples(index=False, name=None):
+            if type_ == "Missing":
+                data = "N" * 100
+                chunks.append(f">{ID}\t{type_}:{seqname}:0:100:100\n{data}\n")
+            else:
+                # get gene/contig information
+                start = int(start)
+                end = int(end)
+
+                # save the core gene sequence. fetch uses the faidx index so
+                # only the requested slice is read, not the whole assembly
+                data = f._fasta.fetch(seqname, start, end)
+                data = "\n".join(textwrap.wrap(data, 80))
+                chunks.append(f">{ID}\t{type_}:{seqname}:{start}:{end}:{end-start}\n{data}\n")
+
         with open(output_fasta_file, "w") as fout:
-            for record in subdf.to_dict("records"):
-                type_ = record["Status"]
-                ID = record["ID"]
-                if type_ == "Missing":
-                    data = "N" * 100
-                    fout.write(f">{ID}\t{type_}:{seqname}:0:100:100\n{data}\n")
-                else:
-                    # get gene/contig information
-                    start = int(record["Gene Start"])
-                    end = int(record["Gene End"])
-                    seqname = record["Sequence"]
-
-                    # save the core gene sequence
-                    ctg_index = f.names.index(seqname)
-                    data = f.sequences[ctg_index][start:end]
-                    data = "\n".join(textwrap.wrap(data, 80))
-                    fout.write(f">{ID}\t{type_}:{seqname}:{start}:{end}:{end-start}\n{data}\n")
+            fout.write("".join(chunks))
@@ -1815,7 +1815,7 @@ class FilteredGenomeCov(object):
                 self.df[column] = self.df[column].apply(func)
 
     def __iadd__(self, other):
-        self.df = self.df.append(other.df)
+        self.df = pd.concat([self.df, other.df])
         return self
 
     def __str__(self):
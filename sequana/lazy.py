@@ -20,6 +20,7 @@ pylab = LazyImport("pylab")
 numpy = LazyImport("numpy")
 pandas = LazyImport("pandas")
 pysam = LazyImport("pysam")
+plotly_offline = LazyImport("plotly.offline")
 
 
 def enabled():
@@ -46,6 +46,10 @@ class SequanaBaseModule(object):
 
     """
 
+    # compiled templates, shared across instances: report builds instantiate
+    # many modules and the parsing needs to be done only once per template
+    _template_cache = {}
+
     def __init__(self, template_fn="standard.html", required_dir=None):
         if required_dir is None:
             self.required_dir = ("css", "js", "images")
@@ -53,10 +57,16 @@ class SequanaBaseModule(object):
             self.required_dir = required_dir
 
         self.output_dir = config.output_dir
+        # subdirectories of the report, built once with os.path.join and
+        # reused by _init_report instead of a list + str.join per access
+        self._dir_paths = {directory: os.path.join(self.output_dir, directory) for directory in self.required_dir}
         self.path = "./"
         # Initiate jinja template
-        env = Environment(loader=PackageLoader("sequana", "resources/templates/"))
-        self.template = env.get_template(template_fn)
+        try:
+            self.template = SequanaBaseModule._template_cache[template_fn]
+        except KeyError:
+            env = Environment(loader=PackageLoader("sequana", "resources/templates/"))
+            self.template = SequanaBaseModule._template_cache[template_fn] = env.get_template(template_fn)
         self._init_report()
         self._fotorama_js_added = False
 
@@ -72,32 +82,28 @@ class SequanaBaseModule(object):
             os.mkdir(self.output_dir)
 
         for directory in self.required_dir:
-            complete_directory = os.sep.join([self.output_dir, directory])
+            complete_directory = self._dir_paths[directory]
             if os.path.isdir(complete_directory) is False:
                 os.mkdir(complete_directory)
 
-        # Copy css/js necessary files
-        for filename in config.css_list:
-            target = os.sep.join([self.output_dir, "css"])
-            if os.path.isfile(target) is False:
-                try:
-                    shutil.copy(filename, target)
-                except PermissionError:
-                    pass
-
-        for filename in config.js_list:
-            target = os.sep.join([self.output_dir, "js"])
-            if os.path.isfile(target) is False:
-                try:
-                    shutil.copy(filename, target)
-                except PermissionError:
-                    pass
-
-        target = os.sep.join([self.output_dir, "images"])
+        # Copy css/js necessary files. The target directory is scanned once
+        # and only missing files are copied, so instantiating many modules
+        # does not re-copy the same files over and over.
+        for directory, file_list in (("css", config.css_list), ("js", config.js_list)):
+            target = self._dir_paths.get(directory, os.path.join(self.output_dir, directory))
+            existing = set(os.listdir(target))
+            for filename in file_list:
+                if os.path.basename(filename) not in existing:
+                    try:
+                        shutil.copy(filename, target)
+                    except PermissionError:
+                        pass
+
+        target = self._dir_paths.get("images", os.path.join(self.output_dir, "images"))
         os.makedirs(target, exist_ok=True)
-        if os.path.isfile(target) is False:
+        if os.path.basename(config.logo) not in set(os.listdir(target)):
             try:
-               shutil.copy(config.logo, target)
+                shutil.copy(config.logo, target)
             except PermissionError:
                 pass
 
@@ -109,7 +115,7 @@ class SequanaBaseModule(object):
         if output_filename is None:
             return
         report_output = self.template.render(config=config, module=self)
-        with open(os.sep.join([config.output_dir, output_filename]), "w") as fp:
+        with open(os.path.join(config.output_dir, output_filename), "w") as fp:
             print(report_output, file=fp)
 
     def create_link(self, name, target, newtab=True, download=False):
@@ -167,7 +173,7 @@ class SequanaBaseModule(object):
 
         Return relative path of the new file location.
         """
-        directory = config.output_dir + os.sep + target_dir
+        directory = os.path.join(config.output_dir, target_dir)
         try:
             os.makedirs(directory)
         except FileExistsError:
@@ -200,10 +206,8 @@ class SequanaBaseModule(object):
 
     def png_to_embedded_png(self, png, style=None, alt="", title=""):
         """Include a PNG file as embedded file."""
-        import base64
-
         with open(png, "rb") as fp:
-            png = base64.b64encode(fp.read()).decode()
+            png = base64.b64encode(fp.read()).decode("ascii")
         if style:
             html = '<img style="{0}" alt="{1}" title="{2}"'.format(style, alt, title)
         else:
@@ -215,19 +219,19 @@ class SequanaBaseModule(object):
         image. You must set the arguments name for the output to connect
         buffer.
         """
-        buf = io.BytesIO()
-        # add buffer as output of the plot function
-        kwargs = dict({input_arg: buf}, **kwargs)
-        try:
-            plot_function(**kwargs)
-            html = "<img "
-            if style:
-                html += 'style="{0}"'.format(style)
-            html += 'src="data:image/png;base64,{0}"/>'.format(base64.b64encode(buf.getvalue()).decode("utf-8"))
-            buf.close()
-        except Exception as err:
-            print(err)
-            html = "image not created"
+        with io.BytesIO() as buf:
+            # add buffer as output of the plot function
+            kwargs = dict({input_arg: buf}, **kwargs)
+            try:
+                plot_function(**kwargs)
+                html = "<img "
+                if style:
+                    html += 'style="{0}"'.format(style)
+                # getbuffer is a zero-copy view, unlike getvalue
+                html += 'src="data:image/png;base64,{0}"/>'.format(base64.b64encode(buf.getbuffer()).decode("ascii"))
+            except Exception as err:
+                print(err)
+                html = "image not created"
         return html
 
     def create_combobox(self, path_list, html_id, newtab=True):
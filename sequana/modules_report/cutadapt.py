@@ -17,9 +17,12 @@
 #
 ##############################################################################
 """Module to write coverage report"""
+import base64
 import io
 import json
+import multiprocessing
 import os
+import re
 from collections import Counter
 
 import colorlog
@@ -33,6 +36,40 @@ from sequana.utils.datatables_js import DataTable
 logger = colorlog.getLogger(__name__)
 
 
+# compiled once at import; these are tested against every line of the log in
+# parse_cutadapt and _get_histogram_data
+_ADAPTER_SECTION_RE = re.compile(r"^=== (?:(?P<read>First|Second) read: )?Adapter (?P<name>.+?) ===")
+_SEQUENCE_RE = re.compile(
+    r"^Sequence: (?P<Sequence>[^;]+); Type: (?P<Type>[^;]+); " r"Length: (?P<Length>[^;]+); Trimmed: (?P<Trimmed>[^;]+)"
+)
+_HIST_HEADER = "length\tcount\texpect\tmax.err\terror counts\n"
+
+
+def _plot_histogram_png(task):
+    """Render one adapter histogram to PNG bytes.
+
+    Module-level so that it can be pickled and dispatched to worker
+    processes by :meth:`CutadaptModule.add_histogram_section`.
+    """
+    from matplotlib.figure import Figure
+
+    key, count, histogram = task
+    try:
+        # an explicit Figure avoids the pyplot state machine: no global
+        # figure registry to clean up, and safe in worker processes
+        fig = Figure()
+        ax = fig.subplots()
+        histogram.plot(ax=ax, logy=False, lw=2, marker="o")
+        ax.set_title(key.replace(" ", "_") + "(%s)" % count)
+        ax.grid(True)
+        buf = io.BytesIO()
+        fig.savefig(buf)
+        return key, buf.getvalue()
+    except Exception as err:  # pragma: no cover
+        print(err)
+        return key, None
+
+
 class CutadaptModule(SequanaBaseModule):
     """Write HTML report of cutadapt analysis"""
 
@@ -40,10 +77,11 @@ class CutadaptModule(SequanaBaseModule):
         """
         :param input:
         """
+        # Expected input data is the cutadapt log file. Fail before any
+        # report setup rather than halfway through read_data
+        if os.path.isfile(cutadapt_log) is False:
+            raise FileNotFoundError("This file {} does not exist".format(cutadapt_log))
         super().__init__()
-        # Expected input data is the cutadapt log file
-        if os.path.exists(cutadapt_log) is False:
-            logger.error("This file {} does not exist".format(cutadapt_log))
         self.input_filename = cutadapt_log
         self.sample_name = sample_name
 
@@ -75,8 +113,11 @@ class CutadaptModule(SequanaBaseModule):
         self.add_log_section()
 
     def read_data(self):
+        # the log is read and decoded once; parse_cutadapt and
+        # _get_histogram_data consume the cached line list
         with open(self.input_filename, "r") as fin:
             self._rawdata = fin.read()
+            self._lines = self._rawdata.splitlines(keepends=True)
             if "Total read pairs processed" in self._rawdata:
                 self.jinja["mode"] = "Paired-end"
                 self.mode = "pe"
@@ -102,11 +143,23 @@ class CutadaptModule(SequanaBaseModule):
         return tobefound
 
     def add_log_section(self):
+        # the full log is copied into the report tree and linked rather than
+        # inlined in the HTML; only the tail is embedded, inside a
+        # collapsible element, so large logs do not inflate the page
+        try:
+            path = self.copy_file(self.input_filename, "data")
+            link = self.create_link("Full cutadapt log", path, download=True)
+        except (FileNotFoundError, PermissionError):  # pragma: no cover
+            link = ""
+        tail = self._rawdata[-65536:]
+        content = "<p>{0}</p>\n<details><summary>Show log tail</summary>\n<pre>\n{1}</pre>\n</details>\n".format(
+            link, tail
+        )
         self.sections.append(
             {
                 "name": "log",
                 "anchor": "log",
-                "content": "<pre>\n" + self._rawdata + "</pre>\n",
+                "content": content,
             }
         )
 
@@ -151,18 +204,31 @@ class CutadaptModule(SequanaBaseModule):
             df.index = [this.replace("paired", "").replace("Pairs", "Reads") for this in df.index]
         return df
 
-    def _get_stat_section(self):
-        datatable = DataTable(self._get_stats(), "cutadapt", index=True)
-        datatable.datatable.datatable_options = {
-            "scrollX": "300px",
-            "pageLength": 30,
-            "scrollCollapse": "true",
-            "dom": "rtpB",
-            "paging": "false",
-            "buttons": ["copy", "csv"],
-        }
+    def _render_datatable(self, df, name, options):
+        """Build a DataTable and return its (html, js) strings.
+
+        Shared by the stats and adapters sections so the options handling and
+        the float format are defined in one place.
+        """
+        datatable = DataTable(df, name, index=True)
+        datatable.datatable.datatable_options = options
         js = datatable.create_javascript_function()
         html_tab = datatable.create_datatable(float_format="%.3g")
+        return html_tab, js
+
+    def _get_stat_section(self):
+        html_tab, js = self._render_datatable(
+            self._get_stats(),
+            "cutadapt",
+            {
+                "scrollX": "300px",
+                "pageLength": 30,
+                "scrollCollapse": "true",
+                "dom": "rtpB",
+                "paging": "false",
+                "buttons": ["copy", "csv"],
+            },
+        )
         # csv_link = self.create_link('link', self.filename)
         # vcf_link = self.create_link('here', 'test.vcf')
         html = (
@@ -176,51 +242,43 @@ class CutadaptModule(SequanaBaseModule):
     def add_stat_section(self):
         self.sections.append({"name": "Stats", "anchor": "stats", "content": self._get_stat_section()})
 
-    def add_adapters_section(self):
-        # Create a Table with adapters
-        df = pd.DataFrame()
-        df = pd.DataFrame(
-            {
-                "Length": [],
-                "Trimmed": [],
-                "Type": [],
-                "Sequence": [],
-            }
-        )
-
-        for count, adapter in enumerate(self.data["adapters"]):
-            name = adapter["name"]
+    def _build_adapters_df(self):
+        """Materialize :attr:`data['adapters']` as a dataframe, built once
+        at parse time and reused by the report sections."""
+        names = []
+        rows = []
+        for adapter in self.data["adapters"]:
+            names.append(adapter["name"])
             info = adapter["info"]
-            df.loc[name] = [
-                info["Length"],
-                info["Trimmed"],
-                info["Type"],
-                info["Sequence"],
-            ]
+            rows.append((info["Length"], info["Trimmed"], info["Type"], info["Sequence"]))
+
+        df = pd.DataFrame(rows, index=names, columns=["Length", "Trimmed", "Type", "Sequence"])
+        # vectorized version of the per-row int(x.replace(...)) maps; the
+        # second form handles logs where the count is not followed by a dot
+        for suffix in ("times.", "times"):
+            try:
+                df["Trimmed"] = df.Trimmed.str.replace(suffix, "", regex=False).str.strip().astype(int)
+                break
+            except (AttributeError, ValueError, TypeError):
+                pass
+        self.adapters_df = df
 
-        df.columns = ["Length", "Trimmed", "Type", "Sequence"]
-        try:
-            df["Trimmed"] = df.Trimmed.map(lambda x: int(x.replace("times.", "")))
-        except:
-            pass
-        try:
-            df["Trimmed"] = df.Trimmed.map(lambda x: int(x.replace("times", "")))
-        except:
-            pass
+    def add_adapters_section(self):
+        # Create a Table with adapters, from the frame materialized at
+        # parse time instead of a row-by-row rebuild per consumer.
+        df = self.adapters_df.sort_values(by="Trimmed", ascending=False)
 
-        # df.to_json(self.sample_name + "/cutadapt/cutadapt_stats2.json")
-        df.sort_values(by="Trimmed", ascending=False, inplace=True)
-
-        datatable = DataTable(df, "adapters", index=True)
-        datatable.datatable.datatable_options = {
-            "scrollX": "true",
-            "pageLength": 15,
-            "scrollCollapse": "true",
-            "dom": "frtipB",
-            "buttons": ["copy", "csv"],
-        }
-        js = datatable.create_javascript_function()
-        html_tab = datatable.create_datatable(float_format="%.3g")
+        html_tab, js = self._render_datatable(
+            df,
+            "adapters",
+            {
+                "scrollX": "true",
+                "pageLength": 15,
+                "scrollCollapse": "true",
+                "dom": "frtipB",
+                "buttons": ["copy", "csv"],
+            },
+        )
         self.jinja["adapters"] = ""
         self.sections.append(
             {
@@ -235,9 +293,6 @@ class CutadaptModule(SequanaBaseModule):
         # image = self.create_embedded_png(self.chromosome.plot_coverage,
         #                              input_arg="filename")
 
-        import textwrap
-
-        command = "\n".join(textwrap.wrap(self.jinja["command"], 80))
         command = self.jinja["command"]
 
         html = "<p>Data type: {}  </p>".format(self.jinja["mode"])
@@ -250,29 +305,29 @@ class CutadaptModule(SequanaBaseModule):
         html = ""
         html += "<div>\n"
 
-        # get keys and count; Sort by number of adapters removed.
-        # TODO: could have reused the df
-        adapter_names = list(histograms.keys())
-
-        count = [histograms[k]["count"].sum() for k in adapter_names]
-        df2 = pd.DataFrame({"key": adapter_names, "count": count})
-        df2.sort_values(by="count", ascending=False, inplace=True)
-
-        for count, key in zip(df2["count"], df2["key"]):
-            if len(histograms[key]) <= 3:
-                continue
+        # keep histograms with enough counts and sort them by number of
+        # adapters removed; a plain sorted list is enough here, no need for
+        # an intermediate dataframe
+        items = [(key, hist["count"].sum()) for key, hist in histograms.items() if len(hist) > 3]
+        items.sort(key=lambda item: item[1], reverse=True)
+
+        # the plots are independent so they are rendered in parallel worker
+        # processes (matplotlib is not thread-safe); results are embedded in
+        # the sorted order computed above
+        tasks = [(key, count, histograms[key]) for key, count in items]
+        if len(tasks) > 1:
+            with multiprocessing.Pool(processes=min(4, len(tasks))) as pool:
+                results = pool.map(_plot_histogram_png, tasks)
+        else:
+            results = [_plot_histogram_png(task) for task in tasks]
 
-            def plotter(filename, key):
-                name = key.replace(" ", "_")
-                pylab.ioff()
-                histograms[key].plot(logy=False, lw=2, marker="o")
-                pylab.title(name + "(%s)" % count)
-                pylab.grid(True)
-                pylab.savefig(filename)
-                pylab.close()  # need to close the figure otherwise warnings
-
-            imagehtml = self.create_embedded_png(plotter, "filename", style="width:45%", key=key)
-            html += imagehtml
+        for key, png in results:
+            if png is None:
+                html += "image not created"
+            else:
+                html += '<img style="width:45%"src="data:image/png;base64,{0}"/>'.format(
+                    base64.b64encode(png).decode("ascii")
+                )
         html += "</div>\n"
 
         self.jinja["cutadapt"] = html
@@ -285,132 +340,146 @@ class CutadaptModule(SequanaBaseModule):
         )
 
     def parse_cutadapt(self):
-        d = {}
         # output
         tobefound = self._get_data_tobefound()
         adapters = []
 
-        data = self._rawdata.splitlines()
-        # some metadata to extract
-        for this in tobefound:
-            key, pattern = this
-            found = [line for line in data if line.startswith(pattern)]
-            if len(found) == 0:
-                logger.warning("ReportCutadapt: %s (not found)" % pattern)
-            elif len(found) == 1:
-                text = found[0].split(":", 1)[1].strip()
-                try:
-                    this, percent = text.split()
-                    self.jinja[key] = this
-                    self.jinja[key + "_percent"] = percent
-                except:
-                    self.jinja[key] = text
-                    self.jinja[key + "_percent"] = "?"
+        data = self._lines
+
+        # metadata patterns to extract, matched in a single pass over the log.
+        # One anchored alternation of literals replaces the per-pattern
+        # startswith checks; SRE dispatches on the first characters so lines
+        # that cannot match are rejected quickly
+        patterns = {pattern: key for key, pattern in tobefound}
+        patterns_re = re.compile("|".join(re.escape(pattern) for pattern in patterns))
+        found_patterns = set()
 
         dd = {}
-        positions = []
         executable = "cutadapt"
-        for pos, this in enumerate(data):
+        found_all = False
+        for this in data:
+            # the metadata all sits in the head of the log; once every
+            # pattern has been seen, skip the regex dispatch entirely
+            if found_all is False:
+                m = patterns_re.match(this)
+                if m:
+                    pattern = m.group(0)
+                    found_patterns.add(pattern)
+                    key = patterns[pattern]
+                    text = this.split(":", 1)[1].strip()
+                    try:
+                        value, percent = text.split()
+                        self.jinja[key] = value
+                        self.jinja[key + "_percent"] = percent
+                    except:
+                        self.jinja[key] = text
+                        self.jinja[key + "_percent"] = "?"
+                    if len(found_patterns) == len(patterns):
+                        found_all = True
             if "This is Atropos" in this:
                 executable = "atropos"
             if "Command line parameters: " in this:
-                cmd = this.split("Command line parameters: ")[1]
+                cmd = this.split("Command line parameters: ")[1].rstrip("\n")
                 self.jinja["command"] = executable + " " + cmd
-            if this.startswith("=== ") and "Adapter" in this:
-                name = this.split("=== ")[1].split(" ===")[0].strip()
-                dd["name"] = name
+            m = _ADAPTER_SECTION_RE.match(this)
+            if m:
+                if m.group("read"):
+                    name = "{} read: Adapter {}".format(m.group("read"), m.group("name"))
+                else:
+                    name = "Adapter {}".format(m.group("name"))
+                dd["name"] = name.strip()
                 continue
-            if this.startswith("Sequence:"):
-                info = this.split("Sequence:", 1)[1].strip()
-                info = info.split(";")
-                dd["info"] = {
-                    "Sequence": info[0].strip(),
-                    "Type": info[1].split(":", 1)[1].strip(),
-                    "Length": info[2].split(":", 1)[1].strip(),
-                    "Trimmed": info[3].split(":", 1)[1].strip(),
-                }
+            m = _SEQUENCE_RE.match(this)
+            if m:
+                dd["info"] = {key: value.strip() for key, value in m.groupdict().items()}
                 adapters.append(dd.copy())
+
+        for pattern in patterns:
+            if pattern not in found_patterns:
+                logger.warning("ReportCutadapt: %s (not found)" % pattern)
+
         self.data["adapters"] = adapters
+        self._build_adapters_df()
+
+    @staticmethod
+    def _histogram_df(rows):
+        """Build an adapter histogram dataframe from pre-split log rows.
+
+        Avoids the text round-trip through StringIO + read_csv for every
+        adapter section. 'error counts' stays a string so that concatenation
+        of several histograms remains coherent.
+        """
+        df = pd.DataFrame.from_records(rows, columns=_HIST_HEADER.strip().split("\t"))
+        return df.astype({"length": int, "count": int, "expect": float, "max.err": int, "error counts": str})
 
     def _get_histogram_data(self):
         """In cutadapt logs, an adapter section contains
         an histogram of matches that starts with a header
         and ends with a blank line
         """
-        header = "length\tcount\texpect\tmax.err\terror counts\n"
-        with open(self.input_filename, "r") as fin:
-            # not too large so let us read everything
-            data = fin.readlines()
-            scanning_histogram = False
-            adapters = []
-            current_hist = header
-            dfs = {}
-
-            if "variable 5'/3'" in "\n".join(data):
-                cutadapt_mode = "b"
-            else:
-                cutadapt_mode = "other"
-
-            for this in data:
-                # while we have not found a new adapter histogram section,
-                # we keep going
-                # !! What about 5' / 3'
-                if this.startswith("==="):
-                    if "read: Adapter" in this:
-                        # We keep read: Adatpter because it may be the first
-                        # or second read so to avoid confusion we keep the full
-                        # name for now.
-                        name = this.replace("First read: Adapter ", "R1_")
-                        name = name.replace("Second read: Adapter ", "R2_")
-                        name = name.strip().strip("===")
-                        name = name.strip()
-                    elif "=== Adapter" in this:
-                        name = this.split("=== ")[1].split(" ===")[0]
-                        name = name.strip()
-                    else:
-                        pass
+        header = _HIST_HEADER
+        rawdata = self._rawdata
+        dfs = {}
 
-                if scanning_histogram is False:
-                    if this == header:
-                        # we found the beginning of an histogram
-                        scanning_histogram = True
-                    else:
-                        # we are somewhere in the log we do not care about
-                        pass
-                elif scanning_histogram is True and len(this.strip()) != 0:
-                    # accumulate the histogram data
-                    current_hist += this
-                elif scanning_histogram is True and len(this.strip()) == 0:
-                    # we found the end of the histogram
-                    # Could be a 5'/3' case ? if so another histogram is
-                    # possible
-                    df = pd.read_csv(io.StringIO(current_hist), sep="\t")
-
-                    # cast the 'error counts' that must be coherent for future concatenation
-                    df = df.astype({"error counts": str})
-
-                    # reinitiate the variables
-                    if cutadapt_mode != "b":
-                        dfs[name] = df.set_index("length")
-                        current_hist = header
-                        scanning_histogram = False
+        if "variable 5'/3'" in rawdata:
+            cutadapt_mode = "b"
+        else:
+            cutadapt_mode = "other"
+
+        # each histogram is delimited by the fixed header line and a blank
+        # line, so the log is sliced directly with C-level find() calls
+        # instead of a stateful per-line scanner
+        name = None
+        pos = 0
+        while True:
+            start = rawdata.find(header, pos)
+            if start < 0:
+                break
+            end = rawdata.find("\n\n", start)
+            if end < 0:
+                # truncated histogram at the end of the log; drop it as the
+                # line-based scanner used to
+                break
+
+            # the adapter this histogram belongs to is the nearest
+            # '=== ... Adapter ... ===' line before the header. We keep the
+            # read tag (R1_/R2_) because the adapter may be found on the
+            # first or second read; the plain 'Adapter' prefix is kept to
+            # avoid name clashes.
+            section = rawdata.rfind("\n=== ", 0, start)
+            if section >= 0 or rawdata.startswith("=== "):
+                line = rawdata[section + 1 : rawdata.find("\n", section + 1)]
+                m = _ADAPTER_SECTION_RE.match(line)
+                if m:
+                    if m.group("read") == "First":
+                        name = "R1_" + m.group("name")
+                    elif m.group("read") == "Second":
+                        name = "R2_" + m.group("name")
                     else:
-                        # there will be another histogram so keep scanning
-                        current_hist = header
-                        # If we have already found an histogram, this is
-                        # therefore the second here.
-                        if name in dfs:
-                            if len(df):
-                                dfs[name] = pd.concat([dfs[name], df.set_index("length")])
-
-                            scanning_histogram = False
-
-                            dfs[name] = dfs[name].reset_index().groupby("length").aggregate("sum")
-                        else:
-                            dfs[name] = df.set_index("length")
-                            scanning_histogram = True
-                else:
-                    pass
+                        name = "Adapter " + m.group("name")
+                    name = name.strip()
+
+            block = rawdata[start + len(header) : end]
+            rows = [line.split("\t") for line in block.split("\n") if line]
+            df = self._histogram_df(rows)
+
+            if cutadapt_mode != "b" or name not in dfs:
+                dfs[name] = df.set_index("length")
+            elif len(df):
+                # 5'/3' case: a second histogram for the same adapter. The
+                # two aligned frames are added directly, which replaces the
+                # former concat + groupby('length').sum() merge
+                first = dfs[name]
+                second = df.set_index("length")
+                numeric = [col for col in first.columns if col != "error counts"]
+                combined = first[numeric].add(second[numeric], fill_value=0)
+                # string column: duplicated lengths are concatenated,
+                # as groupby sum used to do
+                combined["error counts"] = (
+                    pd.concat([first["error counts"], second["error counts"]]).groupby(level=0).sum()
+                )
+                dfs[name] = combined[first.columns.tolist()].astype(first.dtypes.to_dict())
+            pos = end
         return dfs
 
     def parse_atropos(self, filename):
@@ -513,3 +582,4 @@ class CutadaptModule(SequanaBaseModule):
         self.jinja["command"] = "{} {} {}".format(
             "atropos", data["options"]["action"], " ".join(data["options"]["orig_args"])
         )
+        self._build_adapters_df()
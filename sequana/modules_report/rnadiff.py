@@ -12,14 +12,20 @@
 #
 ##############################################################################
 """Module to write differential regulation analysis report"""
+import base64
+import io
+import multiprocessing
 import os
 
 import colorlog
 
+from sequana.lazy import numpy as np
 from sequana.lazy import pandas as pd
+from sequana.lazy import plotly_offline as offline
 from sequana.lazy import pylab
 from sequana.modules_report.base_module import SequanaBaseModule
 from sequana.rnadiff import RNADiffResults
+from sequana.utils import config
 from sequana.utils.datatables_js import DataTable
 
 logger = colorlog.getLogger(__name__)
@@ -28,6 +34,26 @@ logger = colorlog.getLogger(__name__)
 __all__ = ["RNAdiffModule"]
 
 
+def _plot_pvalue_hist_png(comp):
+    """Render the p-value histogram of one comparison to PNG bytes.
+
+    Module-level function so it can be dispatched to a multiprocessing
+    worker; comparisons are independent and matplotlib is process-safe
+    (but not thread-safe).
+    """
+    try:
+        buf = io.BytesIO()
+        with pylab.ioff():
+            pylab.clf()
+            comp.plot_pvalue_hist()
+            pylab.savefig(buf)
+            pylab.close()
+        return buf.getvalue()
+    except Exception as err:  # pragma: no cover
+        print(err)
+        return None
+
+
 class RNAdiffModule(SequanaBaseModule):
     """Write HTML report of variant calling. This class takes a csv file
     generated by sequana_variant_filter.
@@ -58,6 +84,11 @@ class RNAdiffModule(SequanaBaseModule):
         self.create_command_section()
         self.create_html(output_filename)
 
+        # the plot helpers clear the current figure rather than closing it,
+        # so the same figure (and its Agg renderer) is reused throughout the
+        # report; everything is released once here
+        pylab.close("all")
+
         # Fixme not sure this is required to be imported here
         import matplotlib
 
@@ -90,8 +121,19 @@ for that feature.</p>
         )
         self._count_section += 1
 
+        comparisons = list(self.rnadiff.comparisons.items())
+
+        # with several comparisons, the per-comparison histograms are
+        # rendered in parallel; the HTML assembly itself stays serial so
+        # that the section order remains deterministic
+        self._pvalue_hist_pngs = {}
+        if len(comparisons) > 1:
+            with multiprocessing.Pool(processes=min(4, len(comparisons))) as pool:
+                results = pool.map(_plot_pvalue_hist_png, [comp for _, comp in comparisons])
+            self._pvalue_hist_pngs = {name: png for (name, _), png in zip(comparisons, results)}
+
         counter = 1
-        for name, comp in self.rnadiff.comparisons.items():
+        for name, comp in comparisons:
             self.add_individual_report(comp, name, counter)
 
     def create_main_report_content(self):
@@ -124,26 +166,24 @@ for that feature.</p>
             options["dom"] = "Bfrtip"
 
         def get_local_df(Sdata, lfc=0):
-            N = len(Sdata)
-
             if lfc == 0:
                 message = "Number of DGE (any FC)"
             else:
                 message = f"Number of DGE log2(|FC|) > {lfc} "
 
-            df = pd.DataFrame(
+            # built once in the final column order; the previous version
+            # created a placeholder link column, reordered the frame and
+            # then rebuilt the links
+            return pd.DataFrame(
                 {
-                    "comparison_link": [1] * N,
                     "comparison": Sdata.index.values,
-                    "Description": [message] * N,
+                    "Description": message,
                     "Down": Sdata["down"].values,
                     "Up": Sdata["up"].values,
                     "Total": Sdata["all"].values,
+                    "comparison_link": [f"#{name.replace('.', '')}_stats" for name in Sdata.index],
                 }
             )
-            df = df[["comparison", "Description", "Down", "Up", "Total", "comparison_link"]]
-            df["comparison_link"] = [f"#{name.replace('.', '')}_stats" for name in Sdata.index]
-            return df
 
         dt = DataTable(get_local_df(Sdefault), "dge_default")
         dt.datatable.set_links_to_column("comparison_link", "comparison", new_page=False)
@@ -178,7 +218,6 @@ scale). Clicking on any of the link will lead you to the section of the comparis
                 pylab.clf()
                 self.rnadiff.plot_dispersion()
                 pylab.savefig(filename)
-                pylab.close()
 
         html = """<p>dispersion of the fitted data to the model</p>{}<hr>""".format(
             self.create_embedded_png(dispersion, "filename", style=style)
@@ -208,11 +247,12 @@ scale). Clicking on any of the link will lead you to the section of the comparis
                     self.rnadiff.plot_dendogram(count_mode=count_mode, transform_method=transform)
 
                     pylab.savefig(filename)
-                    pylab.close()
 
-        # save image in case of
+        # save image in case of. The figure is rendered once; the embedded
+        # version reuses the PNG bytes written on disk instead of a second
+        # full matplotlib render
         dendogram(f"{self.folder}/images/dendogram.png")
-        image1 = self.create_embedded_png(dendogram, "filename", style=style)
+        image1 = self.png_to_embedded_png(f"{self.folder}/images/dendogram.png", style=style)
 
         if os.path.exists(f"{self.folder}/counts/counts_vst_batch.csv"):
 
@@ -227,9 +267,7 @@ href="https://en.wikipedia.org/wiki/Ward%27s_method"> Ward method </a>. The norm
 max 5,000 most variable features were selected.</p>"""
 
         if os.path.exists(f"{self.folder}/counts/counts_vst_batch.csv"):
-            image2 = self.create_embedded_png(
-                dendogram, "filename", count_mode="vst_batch", transform="none", style=style
-            )
+            image2 = self.png_to_embedded_png(f"{self.folder}/images/dendogram_vst_batch.png", style=style)
             html_dendogram += f"""<p>A batch effect was included. Here is the corrected image</p>{image1}{image2}<hr>"""
         else:
             html_dendogram += f"""{image1}<hr>"""
@@ -245,7 +283,6 @@ max 5,000 most variable features were selected.</p>"""
                 count_mode=count_mode,
             )
             pylab.savefig(filename)
-            pylab.close()
 
         image1 = self.create_embedded_png(pca, "filename", style=style)
         html_pca = f"""<p>The experiment variability is also represented by a
@@ -255,15 +292,8 @@ separate samples from the diﬀerent biological conditions, meaning that the bio
 the main source of variance in the data. The data used is the normalised count matrix transformed using a VST method
 variance stabilization); the first 500 most variable genes were selected. </p>"""
 
-        from plotly import offline
-
         html_pca_plotly = "<p>Here is a PCA showing the first 3 components in 3D.</p>"
 
-        import plotly.io as pio
-
-        pio.renderers.default = "iframe"  # Ensure it's set to browser
-        pio.renderers["browser"].timeout = 60  # Increa
-
         if os.path.exists(f"{self.folder}/counts/counts_vst_batch.csv"):
             image2 = self.create_embedded_png(pca, "filename", count_mode="vst_batch", style=style)
             html_pca += f"""<p>Note that a batch effect was included. </p>{image1}{image2}<hr>"""
@@ -291,7 +321,6 @@ variance stabilization); the first 500 most variable genes were selected. </p>""
             pylab.clf()
             self.rnadiff.plot_count_per_sample(rotation=45)
             pylab.savefig(filename)
-            pylab.close()
 
         html1 = """<p>The following image shows the total number of counted reads
 for each sample. We expect counts to be similar within conditions. They may be
@@ -305,7 +334,6 @@ levels, library concentrations, etc).<p>{}<hr>""".format(
             pylab.clf()
             self.rnadiff.plot_percentage_null_read_counts()
             pylab.savefig(filename)
-            pylab.close()
 
         html_null = """<p>The next image shows the percentage of features with no
 read count in each sample (taken individually). Features with null read counts
@@ -320,7 +348,6 @@ will be set to NA in the final results</p> {}<hr>""".format(
             pylab.clf()
             self.rnadiff.plot_density()
             pylab.savefig(filename)
-            pylab.close()
 
         html_density = """<p>In the following figure, we show the distribution
 of read counts for each sample (log10 scale). We expect replicates to behave in
@@ -334,7 +361,6 @@ considered.</p> {}<hr>""".format(
             pylab.clf()
             self.rnadiff.plot_most_expressed_features()
             pylab.savefig(filename)
-            pylab.close()
 
         html_feature = """<p>The following figure shows for each sample (left
 y-axis) the gene/feature that captures the highest proportion of the reads
@@ -363,12 +389,7 @@ condition</p> {}<hr>""".format(
             ax = pylab.gca()
             xticklabels = ax.get_xticklabels()
             ax.set_xticklabels(xticklabels, rotation=45, ha="right")
-            try:
-                pylab.set_engine_layout("tight")
-            except:
-                pass
             pylab.savefig(filename)
-            pylab.close()
 
         def normedcount(filename):
             pylab.ioff()
@@ -377,12 +398,7 @@ condition</p> {}<hr>""".format(
             ax = pylab.gca()
             xticklabels = ax.get_xticklabels()
             ax.set_xticklabels(xticklabels, rotation=45, ha="right")
-            try:
-                pylab.set_engine_layout("tight")
-            except:
-                pass
             pylab.savefig(filename)
-            pylab.close()
 
         html_boxplot = """<p>A normalization of the data is performed to correct
 the systematic technical biases due to different counts across samples. The
@@ -431,7 +447,6 @@ normalised counts.
             pylab.clf()
             self.rnadiff.plot_upset()
             pylab.savefig(filename)
-            pylab.close()
 
         html_upsetplot = """<p> Upset plots are an alternative to venn diagrams, easing the visualisation of DEG lists overlap between comparisons."""
         img = self.create_embedded_png(upsetplot, "filename", style=style)
@@ -460,42 +475,27 @@ always be the case. </p>"""
             pylab.clf()
             comp.plot_pvalue_hist()
             pylab.savefig(filename)
-            pylab.close()
 
-        def plot_padj_hist(filename):
-            pylab.ioff()
-            pylab.clf()
-            comp.plot_padj_hist()
-            pylab.savefig(filename)
-            pylab.close()
-
-        img1 = self.create_embedded_png(plot_pvalue_hist, "filename", style=style)
-        img2 = self.create_embedded_png(plot_padj_hist, "filename", style=style)
-
-        # FIXME. pvalues adjusted are not relevant so commented for now
-        img2 = ""
+        png = self._pvalue_hist_pngs.get(name)
+        if png is None:
+            img1 = self.create_embedded_png(plot_pvalue_hist, "filename", style=style)
+        else:
+            img1 = '<img style="{}" src="data:image/png;base64,{}"/>'.format(
+                style, base64.b64encode(png).decode("ascii")
+            )
 
         self.sections.append(
             {
                 "name": f"{self._count_section}.{counter}.a pvalue distribution ({name})",
                 "anchor": f"dge_summary",
-                "content": description + img1 + img2,
+                "content": description + img1,
             }
         )
 
-        def plot_volcano(filename):
-            pylab.ioff()
-            pylab.clf()
-            comp.plot_volcano()
-            pylab.savefig(filename)
-            pylab.close()
-
         html_volcano = """<p>The volcano plot here below shows the diﬀerentially
 expressed features with a adjusted p-value below 0.05 (dashed back line).
 The volcano plot represents the log10 of the adjusted P
 value as a function of the log2 ratio of diﬀerential expression. </p>"""
-        # img3 = self.create_embedded_png(plot_volcano, "filename", style=style)
-        img3 = ""
 
         fig = comp.plot_volcano(
             plotly=True,
@@ -503,14 +503,12 @@ value as a function of the log2 ratio of diﬀerential expression. </p>"""
             hover_name=self.kwargs.get("hover_name", None),
         )
 
-        from plotly import offline
-
         plotly = offline.plot(fig, output_type="div", include_plotlyjs=False)
         self.sections.append(
             {
                 "name": f"{self._count_section}.{counter}.b volcano plots ({name})",
                 "anchor": f"{name}_volcano",
-                "content": html_volcano + img3 + "<hr>" + plotly,
+                "content": html_volcano + "<hr>" + plotly,
             }
         )
 
@@ -518,29 +516,30 @@ value as a function of the log2 ratio of diﬀerential expression. </p>"""
 
         df = comp.df.copy()  # .reset_index()
 
-        # here we need to add the annotation if possible
+        # here we need to add the annotation if possible. A left join uses a
+        # single hash lookup pass instead of materializing a list of str()
+        # gene identifiers and re-indexing the whole annotation for every
+        # comparison; features without annotation are simply left empty
         try:
-            df = pd.concat([df, self.rnadiff.annotation.loc[[str(x) for x in comp.df.index]]], axis=1)
+            df = df.join(self.rnadiff.annotation, how="left")
         except Exception as err:
             logger.critical(f"Could not add annotation. {err}. annotation skipped")
 
         df = df.reset_index()
 
-        fold_change = 2 ** df["log2FoldChange"]
-        log10padj = -pylab.log10(df["padj"])
+        # numpy ufuncs on the underlying arrays; pandas power/log dispatch
+        # is noticeably slower on large gene lists. The padj array is
+        # extracted once and reused for the significance mask below
+        padj = df["padj"].to_numpy()
+        fold_change = np.exp2(df["log2FoldChange"].to_numpy())
+        log10padj = -np.log10(padj)
         df.insert(df.columns.get_loc("log2FoldChange") + 1, "FoldChange", fold_change)
         df.insert(df.columns.get_loc("padj") + 1, "log10_padj", log10padj)
 
-        try:
-            del df["dispGeneEst"]
-        except:
-            pass
-
-        for x in ["lfcSE", "stat", "dispersion"]:
-            try:
-                del df[x]
-            except:
-                pass
+        df.drop(
+            columns=[x for x in ("dispGeneEst", "lfcSE", "stat", "dispersion") if x in df.columns],
+            inplace=True,
+        )
         # set options
         options = {
             "scrollX": "true",
@@ -552,17 +551,40 @@ value as a function of the log2 ratio of diﬀerential expression. </p>"""
 
         idname = name.replace(".", "")
 
+        # the full results are also written as a compressed CSV next to the
+        # report so large tables can be retrieved without relying on the
+        # in-page datatable
+        csv_name = f"{name}_degs.csv.gz"
+        df.to_csv(os.path.join(config.output_dir, csv_name), index=False, compression="gzip")
+
+        # boolean mask on the underlying arrays; query() would re-parse the
+        # expression for every comparison and fall back to the Python engine.
+        # NaN padj rows (low-count genes) compare to False and are excluded
+        mask = (padj <= 0.05) & (np.abs(df[comp.l2fc_name].to_numpy()) > 1)
+
+        # float columns are rendered to strings once with numpy; the
+        # per-cell float_format callback of the embedded CSVs is then
+        # bypassed for both tables. NaN stays an empty cell, as before
+        for column in df.columns[df.dtypes == float]:
+            values = df[column].to_numpy()
+            rendered = np.char.mod("%.3e", values)
+            rendered[np.isnan(values)] = ""
+            df[column] = rendered
+
         datatable = DataTable(df, f"{idname}_table_all")
         datatable.datatable.datatable_options = options
         js_all = datatable.create_javascript_function()
-        html_tab_all = datatable.create_datatable(float_format="%.3e")
+        html_tab_all = datatable.create_datatable()
+        datatable_function = datatable.datatable
 
-        df_sign = df.query(f"padj<=0.05 and ({comp.l2fc_name}>1 or {comp.l2fc_name}<-1)")
+        df_sign = df.loc[mask]
 
-        datatable = DataTable(df_sign, f"{idname}_table_sign")
-        datatable.datatable.datatable_options = options
-        js_sign = datatable.create_javascript_function()
-        html_tab_sign = datatable.create_datatable(float_format="%.3e")
+        # both tables share the same columns and options, so the javascript
+        # function of the full table is reused (documented DataTable pattern)
+        # instead of being rebuilt for the significant subset
+        datatable = DataTable(df_sign, f"{idname}_table_sign", datatable_function)
+        js_sign = js_all
+        html_tab_sign = datatable.create_datatable()
 
         content = f"""<p>The following tables give all DGE results. The
 first table contains all significant genes (adjusted yyp-value below 0.05 and absolute fold change of at least 0.5). The following tables contains all results
@@ -583,10 +605,14 @@ without any filtering. Here is a short explanation for each column:
 <h3>Significative only (and |l2fC| > 1) <a id="{idname}_table_sign"></a></h3>
 Here below is a subset of the entire table. It contains all genes below adjusted
 p-value of 0.05 and absolute log2 fold change above 1.
+The full table can also be downloaded as a gzipped CSV file
+<a download href="{csv_name}">here</a>.
 {js_sign} {html_tab_sign}"""
 
         if not self.kwargs.get("split_full_table", False):
-            content += f"""<h3>All genes<a id="{idname}_table_all"></a></h3>{js_all} {html_tab_all}"""
+            # the shared javascript function is already included with the
+            # significant table above
+            content += f"""<h3>All genes<a id="{idname}_table_all"></a></h3> {html_tab_all}"""
         else:
             # create an independent pages (lighter to have N pages rather than everything
             # on the same page. Could be useful for eukaryotes.
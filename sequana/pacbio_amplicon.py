@@ -136,7 +136,7 @@ class Consensus:
             # !! do no reset indices !!! so that inserted dfB is still sorted
             # and next accession with iloc/loc are still correctin the next
             # iteration
-            df = dfA.append(dfB).append(dfC)  # .reset_index(drop = True)
+            df = pd.concat([dfA, dfB, dfC])  # .reset_index(drop = True)
 
         # now we can reset the indices
         df.reset_index(drop=True, inplace=True)
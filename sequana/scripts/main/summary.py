@@ -19,6 +19,14 @@ from sequana.scripts.utils import CONTEXT_SETTINGS
 logger = colorlog.getLogger(__name__)
 
 
+def _fastq_stats(filename):
+    """Compute stats of one FastQ file (used by the process pool)."""
+    from sequana import FastQC
+
+    ff = FastQC(filename, max_sample=1e6, verbose=False)
+    return ff.get_stats()
+
+
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.argument("name", type=click.Path(exists=True), nargs=-1)
 @click.option(
@@ -26,6 +34,13 @@ logger = colorlog.getLogger(__name__)
     required=False,
     type=click.Choice(["bamqc", "bam", "fasta", "fastq", "gff", "vcf", "sam"]),
 )
+@click.option(
+    "--threads",
+    type=click.INT,
+    default=4,
+    show_default=True,
+    help="number of FastQ files processed in parallel (fastq module only)",
+)
 @click.option("--output-file", required=False, type=click.Path())
 def summary(**kwargs):
     """Create a HTML report for various type of NGS formats.
@@ -82,12 +97,18 @@ def summary(**kwargs):
             f = FastA(name)
             f.summary()
     elif module == "fastq":  # there is no module per se. HEre we just call FastA.summary()
-        from sequana import FastQC
-
-        for filename in names:
-            ff = FastQC(filename, max_sample=1e6, verbose=False)
-            stats = ff.get_stats()
-            print(stats)
+        # scanning a FastQ file is CPU-bound; several files are processed in
+        # parallel while results are printed in the input order
+        from concurrent.futures import ProcessPoolExecutor
+
+        threads = min(kwargs["threads"], len(names))
+        if threads > 1:
+            with ProcessPoolExecutor(max_workers=threads) as executor:
+                for stats in executor.map(_fastq_stats, names):
+                    print(stats)
+        else:
+            for filename in names:
+                print(_fastq_stats(filename))
     elif module == "bam":
         import pandas as pd
 
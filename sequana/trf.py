@@ -11,12 +11,15 @@
 #
 ##############################################################################
 import csv
+import io
+import re
 from pathlib import Path
 from typing import List, Optional, Union
 
 import colorlog
 import pandas as pd
 
+from sequana.lazy import numpy as np
 from sequana.lazy import pylab
 
 logger = colorlog.getLogger(__name__)
@@ -108,38 +111,39 @@ class TRF:  # pragma: no cover
         instance, from the example above you will obtain 3 rows, two for the
         first sequence, and one for the second sequence.
         """
-        data = []
-        sequence_name = None
-
         with open(self.filename, "r") as fin:
-
-            # skip lines until we reach "Sequence"
-            while sequence_name is None:
-                line = fin.readline()
-                if line.startswith("Sequence:"):
-                    sequence_name = line.split()[1].strip()
-
-            # now we read the rest of the file
-            count = 0
-            # If we concatenate several files, we also want to ignore the header
-            for line in fin.readlines():
-                if line.startswith("Sequence:"):
-                    sequence_name = line.split()[1].strip()
-                    count += 1
-                    if count % 100000 == 0:
-                        logger.info("scanned {} sequences".format(count))
-                    # logger.info("scanned {} sequences".format(count))
-                else:
-                    this_data = line.split()
-                    if len(this_data) == 15:
-                        this_data[14] = this_data[14][0:max_seq_length]
-                        data.append([sequence_name] + this_data)
-
-        if not data:
+            text = fin.read()
+
+        # locate the Sequence headers in one C-level regex pass. The name is
+        # the first token only (read names may contain spaces).
+        # If we concatenate several files, the per-file preambles are simply
+        # skipped since only the data lines of each block are extracted.
+        header_re = re.compile(r"^Sequence: (\S+)", flags=re.M)
+        data_line_re = re.compile(r"^\d.*\n?", flags=re.M)
+
+        headers = list(header_re.finditer(text))
+
+        # data lines are the only ones starting with a digit (comments,
+        # Parameters and Sequence lines do not). They are gathered per block
+        # so the sequence name can be repeated afterwards, and parsed in a
+        # single read_csv call (C engine) instead of a Python loop with one
+        # split per line.
+        names = []
+        counts = []
+        chunks = []
+        for i, match in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+            data_lines = data_line_re.findall(text, match.end(), end)
+            names.append(match.group(1))
+            counts.append(len(data_lines))
+            chunks.append("".join(data_lines))
+            if (i + 1) % 100000 == 0:
+                logger.info("scanned {} sequences".format(i + 1))
+
+        if sum(counts) == 0:
             raise ValueError(f"No valid TRF data found in {self.filename}")
 
         columns = [
-            "sequence_name",
             "start",
             "end",
             "period_size",
@@ -156,24 +160,14 @@ class TRF:  # pragma: no cover
             "seq1",
             "seq2",
         ]
-        df = pd.DataFrame(data, columns=columns)
+        df = pd.read_csv(io.StringIO("".join(chunks)), sep=" ", header=None, names=columns)
+        df.insert(0, "sequence_name", np.repeat(names, counts))
+        df["seq2"] = df["seq2"].str.slice(0, max_seq_length)
 
-        numeric_cols = [
-            "start",
-            "end",
-            "period_size",
-            "CNV",
-            "size_consensus",
-            "percent_matches",
-            "percent_indels",
-            "score",
-            "A",
-            "C",
-            "G",
-            "T",
-            "entropy",
-        ]
-        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+        # categories are hashed on small integer codes: groupby/isin in the
+        # hist_* methods get faster and memory drops for repeated motifs
+        for column in ("sequence_name", "seq1", "seq2"):
+            df[column] = df[column].astype("category")
 
         df["length"] = df["end"] - df["start"] + 1
         return df
@@ -181,8 +175,10 @@ class TRF:  # pragma: no cover
     def hist_cnvs(self, bins=50, CNVmin=10, motif=None, color="r", log=True):
         """Plot histogram of CNV counts for a given motif list."""
         motif = motif or ["CAG", "AGC", "GCA"]
-        subset = self.df.query("CNV > @CNVmin and seq1 in @motif")
-        subset["CNV"].hist(bins=bins, log=log, color=color)
+        # boolean mask instead of query(): isin uses a C-level hash lookup
+        # while the eval engine compares each row against the Python list
+        mask = (self.df["CNV"].to_numpy() > CNVmin) & self.df["seq1"].isin(motif).to_numpy()
+        self.df.loc[mask, "CNV"].hist(bins=bins, log=log, color=color)
         pylab.xlabel("CNV length (bp)")
         pylab.ylabel("Count")
         pylab.title("Histogram of CNV values")
@@ -195,9 +191,9 @@ class TRF:  # pragma: no cover
         version AGC and GCA.
 
         """
-        cnvs = self.df.query("CNV>@CNVmin and seq1 in @motif").CNV
-        repet = self.df.query("CNV>@CNVmin and seq1 in @motif").period_size
-        data = cnvs * repet
+        mask = (self.df["CNV"].to_numpy() > CNVmin) & self.df["seq1"].isin(motif).to_numpy()
+        subset = self.df.loc[mask]
+        data = subset.CNV * subset.period_size
         data.hist(bins=bins, log=log, color=color)
         pylab.xlabel("Repetition length (bp)")
         pylab.ylabel("#")
@@ -10,11 +10,12 @@
 #  documentation: http://sequana.readthedocs.io
 #
 ##############################################################################
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 import colorlog
 from tqdm import tqdm
 
+from sequana.lazy import numpy as np
 from sequana.lazy import pandas as pd
 from sequana.lazy import pylab, pysam
 from sequana.vcftools import (
@@ -89,6 +90,7 @@ class VariantFile:
         self._contigs = None
         self._df = None
         self._is_joint = None
+        self._metrics_cache = {}
 
         self._snpeff = False
 
@@ -171,8 +173,29 @@ class VariantFile:
         """
         if filter_dict:
             self.filters_params = filter_dict
-        variants = [v for v in self.variants if self._filter_line(v)]
-        return FilteredVariantFile(variants, self)
+        return FilteredVariantFile(self.iter_filtered(), self)
+
+    def iter_filtered(self):
+        """Yield the variants passing the current :attr:`filters_params` lazily."""
+        for variant in self.variants:
+            if self._filter_line(variant):
+                yield variant
+
+    def _variant_metrics(self, variant):
+        """Return (frequency, strand balance) of a variant, cached per ID.
+
+        Both :meth:`_filter_line` and :meth:`_variant_to_dict` need these
+        values; caching avoids computing them twice for every variant that
+        passes the filters.
+        """
+        key = variant.id
+        try:
+            return self._metrics_cache[key]
+        except KeyError:
+            metrics = (compute_frequency(variant), compute_strand_balance(variant))
+            if key is not None:
+                self._metrics_cache[key] = metrics
+            return metrics
 
     def _filter_line(self, variant):
         """Filter variant with parameter set in :attr:`VCF_freebayes.filters`.
@@ -180,42 +203,47 @@ class VariantFile:
         :param vcf.model._Record vcf_line:
         :return: line if all filters are passed.
         """
-        if variant.qual < self.filters_params["freebayes_score"]:
+        # bind the parameter dict and the INFO proxy to locals once; both are
+        # looked up several times per variant in this hot loop
+        params = self.filters_params
+        info = variant.info
+
+        if variant.qual < params["freebayes_score"]:
             return False
 
-        if variant.info["DP"] <= self.filters_params["min_depth"]:
+        if info["DP"] <= params["min_depth"]:
             return False
 
         if self.is_joint:
             return True
 
-        forward_depth = variant.info["SRF"] + sum(variant.info["SAF"])
-        if forward_depth <= self.filters_params["forward_depth"]:
+        forward_depth = info["SRF"] + sum(info["SAF"])
+        if forward_depth <= params["forward_depth"]:
             return False
 
-        reverse_depth = variant.info["SRR"] + sum(variant.info["SAR"])
-        if reverse_depth <= self.filters_params["reverse_depth"]:
+        reverse_depth = info["SRR"] + sum(info["SAR"])
+        if reverse_depth <= params["reverse_depth"]:
             return False
 
-        alt_freq = compute_frequency(variant)
-        if alt_freq[0] < self.filters_params["frequency"]:
+        alt_freq, strand_bal = self._variant_metrics(variant)
+        if alt_freq[0] < params["frequency"]:
             return False
 
-        strand_bal = compute_strand_balance(variant)
-        if strand_bal[0] < self.filters_params["strand_ratio"]:
+        if strand_bal[0] < params["strand_ratio"]:
             return False
 
-        if self.filters_params["keep_polymorphic"] is False and len(variant.alts) > 1:
+        if params["keep_polymorphic"] is False and len(variant.alts) > 1:
             return False
 
         return True
 
     def get_variant_type(self):
-        variants = defaultdict(int)
+        # Counter.update counts an entire tuple of types through a C helper,
+        # instead of one dict increment per type in Python
+        variants = Counter()
         for variant in self.variants:
             if "TYPE" in variant.info:
-                for typ in variant.info["TYPE"]:
-                    variants[typ] += 1
+                variants.update(variant.info["TYPE"])
             elif "SVTYPE" in variant.info:
                 variants[variant.info["SVTYPE"]] += 1
         return variants
@@ -243,27 +271,25 @@ class VariantFile:
     def manhattan_plot(self, chrom_name=None, bins=200, types=["ins", "del", "mnp", "snp", "complex", "INS", "DEL"]):
 
         positions = defaultdict(list)
+        types = set(types)
 
-        for variant in pysam.VariantFile(self.filename):
+        # reuse the variants already parsed instead of re-reading the file;
+        # only the chromosome/position/type fields are needed here
+        for variant in self.variants:
 
             # keeps only the requested type of variants
             if "TYPE" in variant.info:
-                for vkind in variant.info["TYPE"]:
-                    if vkind in types:
-                        # keep track of the chrom name
-                        chrom = variant.chrom
-                        if chrom_name and chrom == chrom_name:
-                            positions[chrom].append(variant.pos)
-                        elif chrom_name is None:
-                            positions[chrom].append(variant.pos)
+                vkinds = variant.info["TYPE"]
             elif "SVTYPE" in variant.info:
-                vkind = variant.info["SVTYPE"]
+                vkinds = [variant.info["SVTYPE"]]
+            else:
+                continue
+
+            for vkind in vkinds:
                 if vkind in types:
                     # keep track of the chrom name
                     chrom = variant.chrom
-                    if chrom_name and chrom == chrom_name:
-                        positions[chrom].append(variant.pos)
-                    elif chrom_name is None:
+                    if chrom_name is None or chrom == chrom_name:
                         positions[chrom].append(variant.pos)
 
         sorted_contigs = dict(sorted(self.contigs.items(), key=lambda item: item[1]))
@@ -286,8 +312,9 @@ class VariantFile:
 
     def hist_score(self, bins=200, min_score=1):
         """Histogram of Quality score"""
-        variants = self.variants
-        pylab.hist([x.qual for x in variants if x.qual >= min_score], bins=bins)
+        # stream the scores into a float array; no intermediate Python list
+        data = np.fromiter((x.qual for x in self.variants if x.qual >= min_score), dtype=float)
+        pylab.hist(data, bins=bins)
 
     def plot_frequency(self):
         sorted_contigs = dict(sorted(self.contigs.items(), key=lambda item: item[1]))
@@ -295,8 +322,7 @@ class VariantFile:
             pass
 
     def _variant_to_dict(self, variant):
-        alt_freq = compute_frequency(variant)
-        strand_bal = compute_strand_balance(variant)
+        alt_freq, strand_bal = self._variant_metrics(variant)
         fisher = compute_fisher_strand_filter(variant)
 
         variant_dict = {
@@ -306,8 +332,8 @@ class VariantFile:
             "reference": variant.ref,
             "alternative": ";".join(str(x) for x in variant.alts),
             "freebayes_score": variant.qual,
-            "strand_balance": ";".join("{0:.3f}".format(x) for x in strand_bal),
-            "fisher_pvalue": "; ".join(f"{x}" for x in fisher),
+            "strand_balance": ";".join(f"{x:.3f}" for x in strand_bal),
+            "fisher_pvalue": "; ".join(map(str, fisher)),
             "ID": variant.id,
         }
 
@@ -317,7 +343,7 @@ class VariantFile:
             variant_dict["type"] = ";".join([variant.info["SVTYPE"]])
 
         if len(self.samples) == 1:
-            variant_dict["frequency"] = "; ".join("{0:.3f}".format(x) for x in alt_freq)
+            variant_dict["frequency"] = "; ".join(f"{x:.3f}" for x in alt_freq)
         else:
 
             # AO is the Alternate allele observation count. It indicates the number of reads
@@ -335,9 +361,9 @@ class VariantFile:
                 data = variant.samples[sample]
                 if data["DP"]:
                     try:
-                        freq = "; ".join("{0:.3f}".format(alt / data["DP"]) for alt in data["AO"])
+                        freq = "; ".join(f"{alt / data['DP']:.3f}" for alt in data["AO"])
                     except TypeError:
-                        freq = "{0:.3f}".format(data["AO"] / data["DP"])
+                        freq = f"{data['AO'] / data['DP']:.3f}"
                     variant_dict[sample] = freq
                     # and genotyping information
                     if "GL" in data:
@@ -408,21 +434,26 @@ class FilteredVariantFile:
     def __init__(self, variants, fb_vcf):
         """.. rubric:: constructor
 
-        :param list variants: list of variants record.
+        :param variants: iterable of variant records; consumed lazily.
         :param VCF_freebayes fb_vcf: class parent.
         """
         self._variants = variants
         self._vcf = fb_vcf
-        self._df = self._vcf_to_df()
+        self._df = None
 
     @property
     def variants(self):
         """Get the variant list."""
+        # the input iterable is materialized on first access only
+        if not isinstance(self._variants, list):
+            self._variants = list(self._variants)
         return self._variants
 
     @property
     def df(self):
         """Get the data frame."""
+        if self._df is None:
+            self._df = self._vcf_to_df()
         return self._df
 
     @property
@@ -434,7 +465,12 @@ class FilteredVariantFile:
         """Create a data frame with the most important information contained
         in the VCF file.
         """
-        return pd.DataFrame([self.vcf._variant_to_dict(v) for v in self.variants])
+        # if the parent already built its dataframe, slice it instead of
+        # converting every filtered variant to a dictionary again
+        if self.vcf._df is not None:
+            ids = set(v.id for v in self.variants)
+            return self.vcf._df[self.vcf._df.ID.isin(ids)].reset_index(drop=True)
+        return pd.DataFrame.from_records(self.vcf._variant_to_dict(v) for v in self.variants)
 
     def to_csv(self, output_filename, info_field=False):
         """Write DataFrame in CSV format.
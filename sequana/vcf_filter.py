@@ -12,6 +12,11 @@
 ##############################################################################
 # CODE KEPT FOR NOW FOR BOOK KEEPING
 # SHOULD BE MERGED INTO freebayes_vcf_filter
+import re
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
 
 
 class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
@@ -102,6 +107,9 @@ class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
         """
         super().__init__(filename, **kwargs)
         self.filter_dict = {"QUAL": -1, "INFO": {}}
+        self._threshold_cache = {}
+        self._compiled_info_filters = []
+        self._compiled_info_source = None
 
         self.apply_dp4_filter = False
         self.apply_af1_filter = False
@@ -111,41 +119,67 @@ class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
         self.dp4_minimum_ratio = 0.75
         self.minimum_af1 = 0.95
 
-    def _filter_info_field(self, info_value, threshold):
-        # Filter the line if assertion info_value compare to threshold
-        # is True. for instance,
-        # info_value = 40 and thrshold="<30"
-        # 40 is not <30 so should return False
-
+    def _compile_threshold(self, threshold):
+        # Turn an expression such as "<30", ">=0.75" or ">30&<60" into a
+        # callable. The operator, the float conversion and the &/| splitting
+        # are all resolved here once instead of on every variant.
         if "&" in threshold:
-            exp1, exp2 = threshold.split("&")
-            exp1 = exp1.strip()
-            exp2 = exp2.strip()
-            return self._filter_info_field(info_value, exp1) and self._filter_info_field(info_value, exp2)
+            comparators = [self._compile_threshold(exp.strip()) for exp in threshold.split("&")]
+            return lambda value: all(comparator(value) for comparator in comparators)
 
         if "|" in threshold:
-            exp1, exp2 = threshold.split("|")
-            exp1 = exp1.strip()
-            exp2 = exp2.strip()
-            return self._filter_info_field(info_value, exp1) or self._filter_info_field(info_value, exp2)
+            comparators = [self._compile_threshold(exp.strip()) for exp in threshold.split("|")]
+            return lambda value: any(comparator(value) for comparator in comparators)
 
+        if threshold.startswith("<="):
+            limit = float(threshold[2:])
+            return lambda value: value <= limit
         if threshold.startswith("<"):
-            if threshold.startswith("<="):
-                if info_value <= float(threshold[2:]):
-                    return True
-            elif info_value < float(threshold[1:]):
-                return True
-        elif threshold.startswith(">"):
-            if threshold.startswith(">="):
-                if info_value >= float(threshold[2:]):
-                    return True
-            elif info_value > float(threshold[1:]):
-                return True
-        return False
+            limit = float(threshold[1:])
+            return lambda value: value < limit
+        if threshold.startswith(">="):
+            limit = float(threshold[2:])
+            return lambda value: value >= limit
+        if threshold.startswith(">"):
+            limit = float(threshold[1:])
+            return lambda value: value > limit
+        return lambda value: False
+
+    def _filter_info_field(self, info_value, threshold):
+        # Filter the line if assertion info_value compare to threshold
+        # is True. for instance,
+        # info_value = 40 and thrshold="<30"
+        # 40 is not <30 so should return False
+        try:
+            comparator = self._threshold_cache[threshold]
+        except KeyError:
+            comparator = self._threshold_cache[threshold] = self._compile_threshold(threshold)
+        return comparator(info_value)
 
     def _get_variant_tag(self, variant):
         return "{}/{}".format(variant.CHROM, variant.POS)
 
+    def _compile_info_filters(self, info_filters):
+        """Pre-parse the INFO filters into (key, name, index, terms, threshold) tuples.
+
+        Interpreting the filter keys (the ``sum(...)`` syntax and the
+        ``DP4[0]`` indexing) only depends on the filter dictionary, so it is
+        done here once rather than for every variant in :meth:`_filter_line`.
+        """
+        compiled = []
+        for key, value in info_filters.items():
+            if key.startswith("sum("):
+                terms = [(field, int(index)) for field, index in re.findall(r"(\w+)\[(\d+)\]", key)]
+                compiled.append((key, None, None, terms, value))
+            elif "[" in key:
+                if "]" not in key:  # pragma: no cover
+                    raise ValueError("Found invalid filter %s" % key)
+                name, index = key.split("[", 1)
+                compiled.append((key, name.strip(), int(index.replace("]", "").strip()), None, value))
+            else:
+                compiled.append((key, key, 0, None, value))
+        return compiled
+
     def _filter_line(self, vcf_line, filter_dict=None, iline=None):
         """
 
@@ -153,22 +187,25 @@ class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
 
         """
         VT = self._get_variant_tag(vcf_line)
+        # bind the INFO mapping once; every filter below reads from it
+        info = vcf_line.INFO
 
         if filter_dict is None:  # prama: no cover
-            # a copy to avoid side effects
-            filter_dict = self.filter_dict.copy()
+            # the method only reads the dictionary, so no defensive copy is
+            # needed per variant
+            filter_dict = self.filter_dict
 
         if filter_dict["QUAL"] != -1 and vcf_line.QUAL < filter_dict["QUAL"]:
-            logger.debug("{} filtered variant with QUAL below {}".format(VT, filter_dict["QUAL"]))
+            logger.debug("%s filtered variant with QUAL below %s", VT, filter_dict["QUAL"])
             return False
 
         if self.apply_indel_filter:
             if self.is_indel(vcf_line) is True:  # pragma: no cover
-                logger.debug("{}: filter out line {} (INDEL)".format(VT, iline))
+                logger.debug("%s: filter out line %s (INDEL)", VT, iline)
                 return False
 
         # DP4
-        if self.apply_dp4_filter and "DP4" in vcf_line.INFO:
+        if self.apply_dp4_filter and "DP4" in info:
             status = self.is_valid_dp4(
                 vcf_line,
                 self.dp4_minimum_depth,
@@ -176,68 +213,56 @@ class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
                 self.dp4_minimum_ratio,
             )
             if not status:
-                logger.debug("{}: filter out DP4 line {} {}".format(VT, iline, vcf_line.INFO["DP4"]))
+                logger.debug("%s: filter out DP4 line %s %s", VT, iline, info["DP4"])
                 return False
 
         # AF1
-        if self.apply_af1_filter and "AF1" in vcf_line.INFO:
+        if self.apply_af1_filter and "AF1" in info:
             status = self.is_valid_af1(vcf_line, self.minimum_af1)
             if not status:
-                logger.debug("{}: filter out AF1 {} on line {}".format(VT, vcf_line.INFO["AF1"], iline))
+                logger.debug("%s: filter out AF1 %s on line %s", VT, info["AF1"], iline)
                 return False
 
-        for key, value in filter_dict["INFO"].items():
-            # valid expr is e.g. sum(DP4[2],DP4[0])
-            # here, we first extract the variable, then add missing [ ]
-            # brackets to make a list and use eval function after setting
-            # the local variable DP4 in the locals namespace
+        # the interpretation of the filter keys is hoisted into
+        # _compile_info_filters; recompile only when the dictionary content
+        # changed (users update filter_dict['INFO'] in place)
+        info_filters = filter_dict["INFO"]
+        if info_filters != self._compiled_info_source:
+            self._compiled_info_filters = self._compile_info_filters(info_filters)
+            self._compiled_info_source = dict(info_filters)
+
+        # bind the bound method once; it is called up to twice per filter
+        filter_info = self._filter_info_field
+
+        for key, name, index, terms, value in self._compiled_info_filters:
             # PV4 skip non morphic cases (no need to filter)
             if key == "PV4" and not self.is_polymorphic(vcf_line):  # pragma no cover
                 return True
 
             # Filter such as " sum(DP[0], DP4[2])<60 "
-            if key.startswith("sum("):
-                # add the missing [] to create an array
-
-                expr = key.replace("sum(", "sum([")[0:-1] + "])"
-
-                # identify the key
-                mykey = expr[5:].split("[")[0]
-                lcl = locals()
-                lcl[mykey] = vcf_line.INFO[mykey]
-                result = eval(expr)
-                if self._filter_info_field(result, value):
-                    logger.debug("{} filtered variant {},{} with value {}".format(VT, result, expr, value))
+            if terms is not None:
+                result = sum(info[field][i] for field, i in terms)
+                if filter_info(result, value):
+                    logger.debug("%s filtered variant %s,%s with value %s", VT, result, key, value)
                     return False
                 else:
                     return True
 
-            # key could be with an index e.g. "DP4[0]<4"
-            if "[" in key:
-                if "]" not in key:  # pragma: no cover
-                    raise ValueError("Found invalid filter %s" % key)
-                else:
-                    key, index = key.split("[", 1)
-                    key = key.strip()
-                    index = int(index.replace("]", "").strip())
-            else:
-                index = 0
-
-            # otherwise, this is probably a valid simple filter such as "DP<4"
+            # otherwise, this is a simple filter such as "DP<4" or "DP4[0]<4"
             try:
-                if type(vcf_line.INFO[key]) != list:
-                    if self._filter_info_field(vcf_line.INFO[key], value):
-                        val = vcf_line.INFO[key]
-                        logger.debug("{}: filtered variant {},{} with value {}".format(VT, key, value, val))
+                data = info[name]
+                if type(data) != list:
+                    if filter_info(data, value):
+                        logger.debug("%s: filtered variant %s,%s with value %s", VT, name, value, data)
                         return False
                 else:
-                    Nlist = len(vcf_line.INFO[key])
+                    Nlist = len(data)
                     if index > Nlist - 1:  # pragma: no cover
                         raise ValueError("Index must be less than %s (starts at zero)" % Nlist)
-                    if self._filter_info_field(vcf_line.INFO[key][index], value):
+                    if filter_info(data[index], value):
                         return False
             except KeyError:  # pragma no cover
-                logger.debug("The information key {} doesn't exist in VCF file (line {}).".format(key, iline + 1))
+                logger.debug("The information key %s doesn't exist in VCF file (line %s).", name, iline + 1)
         return True
 
     def is_polymorphic(self, variant):
@@ -255,99 +280,57 @@ class VCF_mpileup_4dot1(VCFBase):  # pragma: no cover
             return True
         if "," in str(variant.REF[0]):  # pragma: no cover
             return True
-        if "INDEL" in variant.INFO.keys() and variant.INFO["INDEL"]:
+        if variant.INFO.get("INDEL"):
             return True
         return False
 
     def is_valid_af1(self, variant, minimum_af1=0.95):
-        if "AF1" not in variant.INFO.keys():  # pragma: no cover
+        # single INFO lookup; "in" on the mapping avoids building a key list
+        if "AF1" not in variant.INFO:  # pragma: no cover
             return True
+        af1 = variant.INFO["AF1"]
 
         if self.is_polymorphic(variant):
-            if variant.INFO["AF1"] < minimum_af1:
-                return False
-            else:
-                return True
+            return af1 >= minimum_af1
         else:
-            if variant.INFO["AF1"] > 1 - minimum_af1:
-                return False
-            else:
-                return True
+            return af1 <= 1 - minimum_af1
 
     def is_valid_dp4(self, variant, minimum_depth, minimum_depth_strand, minimum_ratio):
         """return true if valid"""
 
-        if "DP4" not in variant.INFO.keys():  # pragma: no cover
+        if "DP4" not in variant.INFO:  # pragma: no cover
             return True
 
-        ref_forward = variant.INFO["DP4"][0]
-        ref_reverse = variant.INFO["DP4"][1]
-        alt_forward = variant.INFO["DP4"][2]
-        alt_reverse = variant.INFO["DP4"][3]
-
-        count_reference = ref_forward + ref_reverse
-        count_alt = alt_forward + alt_reverse
-        # set forward ratio
-        forward = float(ref_forward + alt_forward)
-
-        if forward > 0:
-            ratio_forward_reference = ref_forward / forward
-            ratio_forward_alt = alt_forward / forward
-        else:
-            ratio_forward_reference = 0
-            ratio_forward_alt = 0
-
-        # set reverse ratio
-        reverse = float(ref_reverse + alt_reverse)
+        ref_forward, ref_reverse, alt_forward, alt_reverse = variant.INFO["DP4"]
 
-        if reverse > 0:
-            ratio_reverse_reference = ref_reverse / reverse
-            ratio_reverse_alt = alt_reverse / reverse
-        else:
-            ratio_reverse_reference = 0
-            ratio_reverse_alt = 0
-        if not self.is_polymorphic(variant):
-            # dealing with non polymorphic site (i.e; VCF's ALT
-            # field equals "."
-
-            # reference depth test for the reference allele
-            if count_reference < minimum_depth:  # pragma: no cover
-                return False
-
-            # forward strand depth test for the reference allele
-            if ref_forward < minimum_depth_strand:
-                return False
-
-            # reverse strand depth test for the reference allele
-            if ref_reverse < minimum_depth_strand:
-                return False
-
-            # forward ratio test for the reference allele
-            if ratio_forward_reference < minimum_ratio:
-                return False
-
-            # reverse ratio test for the reference allele
-            if ratio_reverse_reference < minimum_ratio:
-                return False
+        # the same depth/strand/ratio tests apply to the reference allele on a
+        # non polymorphic site (VCF's ALT field equals ".") and to the
+        # alternate allele otherwise; select the counts once and run a single
+        # battery of tests instead of two mirrored branches
+        if self.is_polymorphic(variant):
+            count_forward, count_reverse = alt_forward, alt_reverse
         else:
-            # reference depth test for the alternate allele
-            if count_alt < minimum_depth:
-                return False
+            count_forward, count_reverse = ref_forward, ref_reverse
 
-            # forward strand depth test for the alternate allele
-            if alt_forward < minimum_depth_strand:
-                return False
+        # depth test for the selected allele
+        if count_forward + count_reverse < minimum_depth:
+            return False
 
-            # reverse strand depth test for the alternate allele
-            if alt_reverse < minimum_depth_strand:
-                return False
+        # per-strand depth tests
+        if count_forward < minimum_depth_strand:
+            return False
+        if count_reverse < minimum_depth_strand:
+            return False
 
-            # forward ratio test for the reference allele
-            if ratio_forward_alt < minimum_ratio:
-                return False
+        # per-strand ratio tests (first to second base call)
+        forward = float(ref_forward + alt_forward)
+        ratio_forward = count_forward / forward if forward > 0 else 0
+        if ratio_forward < minimum_ratio:
+            return False
 
-            # reverse ratio test for the alternate allele
-            if ratio_reverse_alt < minimum_ratio:
-                return False
+        reverse = float(ref_reverse + alt_reverse)
+        ratio_reverse = count_reverse / reverse if reverse > 0 else 0
+        if ratio_reverse < minimum_ratio:
+            return False
 
         return True
@@ -54,7 +54,8 @@ def compute_frequency(record):
 
     # For freebayes:
     try:
-        return [float(count) / info["DP"] for count in info["AO"]]
+        depth = info["DP"]
+        return [count / depth for count in info["AO"]]
     except:
         # sniffles
         if "VAF" in info:
@@ -117,6 +118,16 @@ def compute_strand_balance(record):
         info = record.INFO
 
     try:
-        return [strand_ratio(x, y) for x, y in zip(info["SAF"], info["SAR"])]
+        # inlined strand_ratio to keep this per-variant hot path free of
+        # function-call and exception-handling overhead
+        ratios = []
+        for x, y in zip(info["SAF"], info["SAR"]):
+            total = x + y
+            if total:
+                ratio = x / total
+                ratios.append(ratio if ratio <= 0.5 else 1 - ratio)
+            else:
+                ratios.append(0)
+        return ratios
     except KeyError:
         return [0.5]
@@ -95,7 +95,13 @@ class Cluster:
 
         return data
 
-    def _plot(self, Xr, pca=None, pc1=0, pc2=1, colors=None, show_labels=True, fontsize=10):
+    def _plot(self, Xr, pca=None, pc1=0, pc2=1, colors=None, show_labels=True, fontsize=10, ax=None):
+
+        # default to the pyplot current axes so existing callers keep their
+        # behaviour; callers may pass an explicit Axes (e.g. from a Figure
+        # built outside the pyplot state machine)
+        if ax is None:
+            ax = pylab.gca()
 
         if colors is None:
             colors = [self.colors[k] for k in self.labels]
@@ -109,15 +115,14 @@ class Cluster:
                     colors[k] = "r"
             colors = [colors[k] for k in self.labels]
 
-        pylab.scatter(Xr[:, pc1], Xr[:, pc2], c=colors)
-        ax = pylab.gca()
-        X1, X2 = pylab.xlim()
+        ax.scatter(Xr[:, pc1], Xr[:, pc2], c=colors)
+        X1, X2 = ax.get_xlim()
         dX = X2 - X1
-        pylab.xlim([X1 + X1 * 0.05, X2 + X2 * 0.05])
+        ax.set_xlim([X1 + X1 * 0.05, X2 + X2 * 0.05])
 
-        Y1, Y2 = pylab.ylim()
+        Y1, Y2 = ax.get_ylim()
         dY = Y2 - Y1
-        pylab.ylim([Y1 + Y1 * 0.05, Y2 + Y2 * 0.05])
+        ax.set_ylim([Y1 + Y1 * 0.05, Y2 + Y2 * 0.05])
 
         count = 0
         if fontsize == 0:
@@ -131,12 +136,12 @@ class Cluster:
                 if count > 100:
                     break
         if pca:
-            pylab.xlabel(
+            ax.set_xlabel(
                 "PC{} ({}%)".format(pc1 + 1, round(pca.explained_variance_ratio_[pc1] * 100, 2)),
                 fontsize=12,
             )
-            pylab.ylabel(
+            ax.set_ylabel(
                 "PC{} ({}%)".format(pc2 + 1, round(pca.explained_variance_ratio_[pc2] * 100, 2)),
                 fontsize=12,
             )
-        pylab.grid(True)
+        ax.grid(True)
@@ -1,3 +1,4 @@
+import pytest
 from easydev import TempFile
 
 from sequana.pacbio import BAMSimul, Barcoding, PacbioSubreads, PBSim
@@ -6,9 +7,23 @@ from sequana.pacbio import BAMSimul, Barcoding, PacbioSubreads, PBSim
 from . import test_dir
 
 
-def test_pacbio():
-    filename = f"{test_dir}/data/bam/test_pacbio_subreads.bam"
-    b = PacbioSubreads(filename)
+@pytest.fixture(scope="module")
+def subreads():
+    # a single reader shared by the tests below; re-instantiating
+    # PacbioSubreads in every test re-scans the whole BAM file
+    return PacbioSubreads(f"{test_dir}/data/bam/test_pacbio_subreads.bam")
+
+
+@pytest.fixture
+def fresh_subreads(subreads):
+    # force the dataframe to be recomputed from scratch without re-opening
+    # the BAM reader
+    subreads._df = None
+    return subreads
+
+
+def test_pacbio(subreads):
+    b = subreads
     assert len(b) == 130
     b.df
     # assert b.nb_pass[1] == 130
@@ -23,31 +38,30 @@ def test_pacbio():
 
     b.summary()
 
-    filename = f"{test_dir}/data/bam/test_pacbio_subreads.bam"
-    b = PacbioSubreads(filename)
 
-    # test hist_snr from scratch
-    b._df = None
-    b.hist_snr()
+def test_hist_snr(fresh_subreads):
+    fresh_subreads.hist_snr()
 
-    # test hist_len from scratch
-    b._df = None
+
+def test_hist_read_length(fresh_subreads):
+    b = fresh_subreads
     b.hist_read_length()
     b.hist_nb_passes()
     b.get_mean_nb_passes()
     b.get_number_of_ccs()
     b.boxplot_read_length_vs_passes()
 
-    # test from scratch
-    b._df = None
-    b.hist_GC()
 
-    # test from scratch
-    b._df = None
-    b.plot_GC_read_len()
+def test_hist_GC(fresh_subreads):
+    fresh_subreads.hist_GC()
+
+
+def test_plot_GC_read_len(fresh_subreads):
+    fresh_subreads.plot_GC_read_len()
+
 
-    # test from scratch
-    b._df = None
+def test_export(fresh_subreads):
+    b = fresh_subreads
 
     with TempFile() as fh:
         b.to_fasta(fh.name, threads=1)
@@ -57,24 +71,19 @@ def test_pacbio():
         b.save_summary(fh.name)
 
 
-def test_pacbio_stride():
-    filename = f"{test_dir}/data/bam/test_pacbio_subreads.bam"
-    b = PacbioSubreads(filename)
+def test_pacbio_stride(subreads):
     with TempFile() as fh:
-        b.stride(fh.name, stride=2)
+        subreads.stride(fh.name, stride=2)
     with TempFile() as fh:
-        b.stride(fh.name, stride=2, random=True)
-
+        subreads.stride(fh.name, stride=2, random=True)
 
-def test_pacbio_random():
-    filename = f"{test_dir}/data/bam/test_pacbio_subreads.bam"
-    b = PacbioSubreads(filename)
 
+def test_pacbio_random(subreads):
     with TempFile() as fh:
-        b.random_selection(fh.name, nreads=10)
+        subreads.random_selection(fh.name, nreads=10)
 
     with TempFile() as fh:
-        b.random_selection(fh.name, expected_coverage=10, reference_length=10000)
+        subreads.random_selection(fh.name, expected_coverage=10, reference_length=10000)
 
 
 def test_bamsim():